@@ -1,3 +1,4 @@
 import kmc_ising.supporting_tools
 import kmc_ising.core
+import kmc_ising.state
 import kmc_ising.algorithm
@@ -7,6 +7,7 @@ This module implements the kMC algorithm for modeling a one-dimensional Ising ch
 
 Classes:
     KmcIsing: Implementation of the algorithm.
+    PackedKmcIsing: Implementation of the algorithm on the bit-packed state.
 """
 
 ########################################################################################################################
@@ -17,8 +18,16 @@ Classes:
 import multiprocessing
 import random
 import math
+import time
+import statistics
+import inspect
+import numpy
 from kmc_ising.supporting_tools import Notification
 from kmc_ising.supporting_tools import Error
+from kmc_ising.state import PackedState
+
+
+_FFT_OUT = 'out' in inspect.signature(numpy.fft.rfft).parameters  # NumPy >= 2.0
 
 
 ########################################################################################################################
@@ -43,6 +52,14 @@ class KmcIsing(multiprocessing.Process):
         self._delta_t: Model parameter.
         self._chosen_molecule: Model parameter.
         self._t: Model parameter.
+        self._correlation: Sampling interval of C(r) in steps (None - C(r) is not sampled).
+        self._spins: Buffer for the spin array and the inverse FFT.
+        self._spectrum: Buffer for the FFT of the spin array.
+        self._ct: Time-weighted sum of C(r).
+        self._ct_mt: Time-weighted sum of the magnetization per molecule for C(r).
+        self._ct_t: Sum of the weights of C(r) samples.
+        self._ct_cost: Time spent on C(r) sampling.
+        self._replicas: Number of independent replicas of the row.
     """
     # ==================================================================================================================
 
@@ -50,7 +67,7 @@ class KmcIsing(multiprocessing.Process):
 
     # ==================================================================================================================
 
-    def __init__(self, filename, **kwargs):
+    def __init__(self, filename, correlation=None, replicas=1, **kwargs):
         super().__init__()
         # Attributes bounded with tasks execution: ---------------------------------------------------------------------
         self._kwargs = kwargs
@@ -66,6 +83,20 @@ class KmcIsing(multiprocessing.Process):
         self._jt = None
         # --------------------------------------------------------------------------------------------------------------
 
+        # Attributes bounded with correlation function: ----------------------------------------------------------------
+        self._correlation = correlation
+        self._spins = None
+        self._spectrum = None
+        self._ct = None
+        self._ct_mt = 0
+        self._ct_t = 0
+        self._ct_cost = 0
+        # --------------------------------------------------------------------------------------------------------------
+
+        # Attributes bounded with replicas: ----------------------------------------------------------------------------
+        self._replicas = replicas
+        # --------------------------------------------------------------------------------------------------------------
+
         # Attributes bounded with supporting goals: --------------------------------------------------------------------
         self.daemon = True  # Process's attribute
         self._filename = filename
@@ -83,59 +114,143 @@ class KmcIsing(multiprocessing.Process):
                      what=f"""row number "{self._kwargs.get('#')}" in file "{self._filename}" simulation started  """,
                      for_verbose=True)()
         # --------------------------------------------------------------------------------------------------------------
-        self._generate_state()
-        self._partial_sums = [x for x in self._state]
-        for i in range(self._steps):
-            self._count_partial_sums()
-            self._count_r()
-            self._generate_p()
-            self._count_delta_t()
-            self._choose_molecule()
-            self._change_spin()
-            self._add_to_t()
-            self._add_to_mt()
-            self._add_to_jt()
+        start_time = time.perf_counter()
+        results = []
+        for replica in range(self._replicas):
+            random.seed()  # Independent seed for every replica, also with one replica per worker
+            self._reset()
+            self._generate_state()
+            # Buffers are allocated once and reused by the replicas: ---------------------------------------------------
+            if self._correlation is not None and self._ct is None:
+                self._spins = numpy.empty(len(self._state), dtype=numpy.float64)
+                self._spectrum = numpy.empty(len(self._state) // 2 + 1, dtype=numpy.complex128)
+                self._ct = numpy.zeros(len(self._state) // 2 + 1, dtype=numpy.float64)
+            # ----------------------------------------------------------------------------------------------------------
+            for i in range(self._steps):
+                self._count_partial_sums()
+                self._count_r()
+                self._generate_p()
+                self._count_delta_t()
+                self._choose_molecule()
+                self._change_spin()
+                self._add_to_t()
+                self._add_to_mt()
+                self._add_to_jt()
+                if self._correlation is not None and i % self._correlation == 0:
+                    self._add_to_ct()
+            results.append((self._jt/self._t, self._mt/self._t,
+                            self._correlation_length() if self._correlation is not None else None))
+        u, m, xi = zip(*results)
+
+        # Correlation length and the cost of C(r) sampling: ------------------------------------------------------------
+        correlation = ''
+        if self._correlation is not None:
+            run_time = time.perf_counter() - start_time
+            fitted = [x for x in xi if x is not None and math.isfinite(x)]  # Replicas with the fitted xi
+            if self._replicas == 1:
+                xi = f'{xi[0]}'
+            elif len(fitted) < 2:
+                xi = f'{fitted[0] if fitted else None} ({len(fitted)} of {self._replicas} replicas, no error estimate)'
+            else:
+                xi = f'{self._estimate(fitted)} ({len(fitted)} of {self._replicas} replicas)'
+            correlation = f"""
+                             xi = {xi}
+                             C(r) sampling: {self._ct_cost:.3f} s ({100 * self._ct_cost / run_time:.1f} % of run time)"""
+        # --------------------------------------------------------------------------------------------------------------
+
         # Send notification to the notification handler: ---------------------------------------------------------------
+        replicas = f"""
+                             replicas = {self._replicas}""" if self._replicas > 1 else ''
         Notification(where=f'{self.__class_path}.run()',
-                     what=f"""row number "{self._kwargs.get('#')}" in file "{self._filename}" is simulated:
-                             <U> = {self._jt/self._t}  
-                             <M> = {self._mt/self._t}   """,
+                     what=f"""row number "{self._kwargs.get('#')}" in file "{self._filename}" is simulated:{replicas}
+                             <U> = {self._estimate(u)}  
+                             <M> = {self._estimate(m)}   {correlation}""",
                      task_end=True)()
         # --------------------------------------------------------------------------------------------------------------
 
     # ==================================================================================================================
 
+    @staticmethod
+    def _estimate(values):
+        """
+        Mean and standard error of the values over replicas ("mean ± error"), or the value for one replica.
+        """
+        if len(values) == 1:
+            return f'{values[0]}'
+        return f'{statistics.mean(values)} ± {statistics.stdev(values) / math.sqrt(len(values))}'
+
+    # ==================================================================================================================
+
+    def _reset(self):
+        """
+        Reset the model parameters before the next replica (the state is overwritten by self._generate_state()).
+        """
+        self._r = None
+        self._p = None
+        self._delta_t = None
+        self._chosen_molecule = None
+        self._t = None
+        self._mt = None
+        self._jt = None
+        if self._ct is not None:
+            self._ct.fill(0)
+        self._ct_mt = 0
+        self._ct_t = 0
+
+    # ==================================================================================================================
+
+    def _check_arguments(self):
+        """
+        Check the initial state arguments of the row, terminate the task if they are wrong.
+        """
+        why = None
+        # If 'uniform' was passed without the field direction: ---------------------------------------------------------
+        if self._kwargs.get('S')[0] == 'uniform' and self._kwargs.get('B') == 0:
+            why = 'uniform state needs nonzero B'
+        # --------------------------------------------------------------------------------------------------------------
+
+        # If wrong N in file: ------------------------------------------------------------------------------------------
+        elif (self._kwargs.get('S')[0] not in ('random', 'uniform') and
+              len(self._kwargs.get('S')) != int(self._kwargs.get('N'))):
+            why = 'number of sequence elements is not equal to N'
+        # --------------------------------------------------------------------------------------------------------------
+        if why is not None:
+            Error(where=f'{self.__class_path}._check_arguments()',
+                  why=f"""{why} in row number "{self._kwargs.get('#')}" 
+                      in file "{self._filename}" """,
+                  task_end=True)()
+            exit(1)
+
+    # ==================================================================================================================
+
     def _generate_state(self):
         """
         Generate the initial state.
         """
+        self._check_arguments()
+
+        # The lists are allocated once and overwritten by the next replicas: -------------------------------------------
+        if len(self._state) != int(self._kwargs.get('N')):
+            self._state = [0] * int(self._kwargs.get('N'))
+            self._partial_sums = [0] * int(self._kwargs.get('N'))
+        # --------------------------------------------------------------------------------------------------------------
 
         # If 'random' was passed: --------------------------------------------------------------------------------------
         if self._kwargs.get('S')[0] == 'random':
             for i in range(int(self._kwargs.get('N'))):
-                self._state.append(random.choice([-1, 1]))
+                self._state[i] = random.choice([-1, 1])
         # --------------------------------------------------------------------------------------------------------------
 
         # If 'uniform' was passed: -------------------------------------------------------------------------------------
         elif self._kwargs.get('S')[0] == 'uniform':
             for i in range(int(self._kwargs.get('N'))):
-                if self._kwargs.get('B') > 0:
-                    self._state.append(1)
-                elif self._kwargs.get('B') < 0:
-                    self._state.append(-1)
+                self._state[i] = 1 if self._kwargs.get('B') > 0 else -1
         # --------------------------------------------------------------------------------------------------------------
 
         # If spin sequence was passed: ---------------------------------------------------------------------------------
         else:
-            self._state = [int(x) for x in self._kwargs.get('S')]
-            if len(self._state) != int(self._kwargs.get('N')):
-                # If wrong N in file: ----------------------------------------------------------------------------------
-                Error(where=f'{self.__class_path}._generate_model()',
-                      why=f"""number of sequence elements is not equal to N in row number "{self._kwargs.get('#')}" 
-                          in file "{self._filename}" """,
-                      task_end=True)()
-                exit(1)
-                # ------------------------------------------------------------------------------------------------------
+            for i in range(int(self._kwargs.get('N'))):
+                self._state[i] = int(self._kwargs.get('S')[i])
         # --------------------------------------------------------------------------------------------------------------
 
     # ==================================================================================================================
@@ -144,8 +259,8 @@ class KmcIsing(multiprocessing.Process):
         """
         Count sequence of the partial sums.
         """
-        if self._chosen_molecule is None or self._chosen_molecule == 0:
-            start = 0
+        if self._chosen_molecule is None or self._chosen_molecule in (0, len(self._state) - 1):
+            start = 0  # The last molecule is the neighbour of the first one
         else:
             start = self._chosen_molecule - 1
         for i in range(start, len(self._state)):
@@ -200,10 +315,11 @@ class KmcIsing(multiprocessing.Process):
         """
         Choose a random molecule.
         """
+        threshold = random.uniform(0, 1) * self._r  # Independent of self._p, which sets the time step
         for i in range(len(self._partial_sums)):
-            if i == 0 and self._p * self._r < self._partial_sums[i]:
+            if i == 0 and threshold < self._partial_sums[i]:
                 self._chosen_molecule = 0
-            elif self._partial_sums[i - 1] <= self._p * self._r < self._partial_sums[i]:
+            elif self._partial_sums[i - 1] <= threshold < self._partial_sums[i]:
                 self._chosen_molecule = i
 
     # ==================================================================================================================
@@ -257,6 +373,188 @@ class KmcIsing(multiprocessing.Process):
             # ----------------------------------------------------------------------------------------------------------
         self._jt += partial_sum * self._delta_t
 
+    # ==================================================================================================================
+
+    def _fill_spins(self):
+        """
+        Copy the state to the spin array buffer.
+        """
+        self._spins[:] = self._state
+
+    # ==================================================================================================================
+
+    def _add_to_ct(self):
+        """
+        Add C(r) = 1/N * sum(s(i) * s(i + r)) of the current state, weighted by the time since the previous sample.
+
+        C(r) of the ring is the circular autocorrelation of the spin array, so it is counted by FFT in O(N log N).
+         FFT is written to the preallocated buffers (the inverse one - over the spin array), so the sampling takes
+         about 20 bytes per molecule and allocates nothing per sample. The buffers are float64: numpy.fft copies
+         float32 input to a float64 scratch array on every call. On NumPy < 2.0 numpy.fft has no "out" and
+         allocates temporary arrays.
+        """
+        start_time = time.perf_counter()
+        weight = self._t - self._ct_t
+        self._fill_spins()
+        self._ct_mt += float(self._spins.mean()) * weight
+
+        # Power spectrum |F|^2 in place: -------------------------------------------------------------------------------
+        if _FFT_OUT:
+            numpy.fft.rfft(self._spins, out=self._spectrum)
+        else:
+            self._spectrum[:] = numpy.fft.rfft(self._spins)
+        parts = self._spectrum.view(numpy.float64).reshape(-1, 2)
+        parts *= parts
+        parts[:, 0] += parts[:, 1]
+        parts[:, 1] = 0
+        # --------------------------------------------------------------------------------------------------------------
+
+        # Inverse FFT over the spin array buffer: ----------------------------------------------------------------------
+        if _FFT_OUT:
+            numpy.fft.irfft(self._spectrum, n=len(self._spins), out=self._spins)
+        else:
+            self._spins[:] = numpy.fft.irfft(self._spectrum, n=len(self._spins))
+        correlation = self._spins[:len(self._ct)]
+        correlation *= weight / len(self._spins)
+        numpy.add(self._ct, correlation, out=self._ct)
+        # --------------------------------------------------------------------------------------------------------------
+        self._ct_t = self._t
+        self._ct_cost += time.perf_counter() - start_time
+
+    # ==================================================================================================================
+
+    def _correlation_length(self):
+        """
+        Fit the connected correlation function G(r) = <C(r)> - <m>^2 by exp(-r/xi) and return xi.
+
+        Only G(r) up to its first non-positive value is fitted, log(G) is weighted by G to suppress the noisy tail.
+         Returns None if there is nothing to fit.
+        """
+        if not self._ct_t:
+            return None
+        g = self._ct / self._ct_t - (self._ct_mt / self._ct_t) ** 2
+        cut = len(g) if (g > 0).all() else int(numpy.argmin(g > 0))
+        if cut < 2:
+            return None
+        slope = numpy.polyfit(numpy.arange(cut), numpy.log(g[:cut]), 1, w=g[:cut])[0]
+        return -1 / slope if slope < 0 else math.inf
+
+
+########################################################################################################################
+# M A I N   C L A S S :  ###############################################################################################
+########################################################################################################################
+
+
+class PackedKmcIsing(KmcIsing):
+    """"
+    Implementation of the algorithm on the bit-packed state.
+
+    The same kMC algorithm, but the state is kmc_ising.state.PackedState: one bit per spin,
+     and the sequence of the partial sums is replaced by the counts of the six rate classes,
+     so the step takes O(log N) time and the chain takes about N / 8 bytes of memory.
+
+    Attributes:
+        self._rates: Rate of the molecule of each class.
+    """
+
+    # ==================================================================================================================
+
+    def __init__(self, filename, correlation=None, replicas=1, **kwargs):
+        super().__init__(filename, correlation, replicas, **kwargs)
+        self._rates = None
+
+    # ==================================================================================================================
+
+    def _generate_state(self):
+        """
+        Generate the initial state.
+        """
+        self._check_arguments()
+        reuse = self._state if self._state.__class__ is PackedState else None  # Buffers of the previous replica
+
+        # If 'random' was passed: --------------------------------------------------------------------------------------
+        if self._kwargs.get('S')[0] == 'random':
+            self._state = PackedState.from_random(int(self._kwargs.get('N')), reuse)
+        # --------------------------------------------------------------------------------------------------------------
+
+        # If 'uniform' was passed: -------------------------------------------------------------------------------------
+        elif self._kwargs.get('S')[0] == 'uniform':
+            self._state = PackedState.from_uniform(int(self._kwargs.get('N')), self._kwargs.get('B') > 0, reuse)
+        # --------------------------------------------------------------------------------------------------------------
+
+        # If spin sequence was passed: ---------------------------------------------------------------------------------
+        else:
+            self._state = PackedState.from_sequence([int(x) for x in self._kwargs.get('S')], reuse)
+        # --------------------------------------------------------------------------------------------------------------
+
+        # Rate of the molecule with spin s and the sum of the neighbour spins h is exp(-J/2*s*h - s*B): ----------------
+        self._rates = [math.exp(-self._kwargs.get('J') / 2 * s * h - s * self._kwargs.get('B'))
+                       for s in (-1, 1) for h in (-2, 0, 2)]
+        # --------------------------------------------------------------------------------------------------------------
+
+    # ==================================================================================================================
+
+    def _count_partial_sums(self):
+        """
+        Class counts are updated by the state itself when the spin is changed.
+        """
+
+    # ==================================================================================================================
+
+    def _count_r(self):
+        """
+        Model parameter counting.
+        """
+        self._r = sum(count * rate for count, rate in zip(self._state.class_counts, self._rates))
+
+    # ==================================================================================================================
+
+    def _choose_molecule(self):
+        """
+        Choose a random molecule.
+        """
+        # Choose the class with probability proportional to its total rate: --------------------------------------------
+        threshold = random.uniform(0, 1) * self._r  # Independent of self._p, which sets the time step
+        class_index = 0
+        for class_index, (count, rate) in enumerate(zip(self._state.class_counts, self._rates)):
+            if threshold < count * rate:
+                break
+            threshold -= count * rate
+        while not self._state.class_counts[class_index]:  # Rounding error at the end of the classes
+            class_index -= 1
+        # --------------------------------------------------------------------------------------------------------------
+
+        # Choose the molecule of this class uniformly: -----------------------------------------------------------------
+        self._chosen_molecule = self._state.find(class_index, random.randrange(self._state.class_counts[class_index]))
+        # --------------------------------------------------------------------------------------------------------------
+
+    # ==================================================================================================================
+
+    def _change_spin(self):
+        self._state.set(self._chosen_molecule, random.choice([-1, 1]))
+
+    # ==================================================================================================================
+
+    def _add_to_mt(self):
+        if self._mt is None:
+            self._mt = 0
+        self._mt += self._state.magnetization * self._delta_t
+
+    # ==================================================================================================================
+
+    def _add_to_jt(self):
+        if self._jt is None:
+            self._jt = 0
+        self._jt += -self._kwargs.get('J') * self._state.bond_sum * self._delta_t
+
+    # ==================================================================================================================
+
+    def _fill_spins(self):
+        """
+        Copy the state to the spin array buffer.
+        """
+        self._state.fill_spins(self._spins)
+
 
 ########################################################################################################################
 # E N D   O F   F I L E .  #############################################################################################
@@ -85,6 +85,51 @@ class Core:
 
     # ==================================================================================================================
 
+    @property
+    def packed_mode(self):
+        """
+        Getter for "-p" flag.
+        """
+        return self._kwargs.get('p')
+
+    # ==================================================================================================================
+
+    @property
+    def correlation_interval(self):
+        """
+        Getter for "-c" parameter.
+        """
+        return self._kwargs.get('c')
+
+    # ==================================================================================================================
+
+    @property
+    def replicas(self):
+        """
+        Getter for "-r" parameter.
+        """
+        return self._kwargs.get('r') or 1
+
+    # ==================================================================================================================
+
+    @property
+    def shard(self):
+        """
+        Getter for "--shard" parameter.
+        """
+        return self._kwargs.get('shard')
+
+    # ==================================================================================================================
+
+    @property
+    def rows(self):
+        """
+        Getter for "--rows" parameter.
+        """
+        return self._kwargs.get('rows')
+
+    # ==================================================================================================================
+
     @property
     def filename(self):
         """
@@ -140,7 +185,7 @@ class Core:
                 # ------------------------------------------------------------------------------------------------------
             # If temperature plotting mode is off: ---------------------------------------------------------------------
             self._process_counter_event.set()
-            for param_dict in extract_parameter_sequence(self.filename):
+            for param_dict in extract_parameter_sequence(self.filename, rows=self.rows, shard=self.shard):
                 if self._process_counter.value <= self.__CPU_COUNT:
                     self._process_counter.value += 1
                     if param_dict.__class__ is not dict:
@@ -150,7 +195,12 @@ class Core:
                               task_end=True)()
                         # ----------------------------------------------------------------------------------------------
                     else:
-                        process = kmc_ising.algorithm.KmcIsing(self.filename, **param_dict)
+                        if self.packed_mode:
+                            process = kmc_ising.algorithm.PackedKmcIsing(self.filename, self.correlation_interval,
+                                                                       self.replicas, **param_dict)
+                        else:
+                            process = kmc_ising.algorithm.KmcIsing(self.filename, self.correlation_interval,
+                                                                 self.replicas, **param_dict)
                         process.start()
                 else:
                     # Waiting when process_counter <= CPU_COUNT: -------------------------------------------------------
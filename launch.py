@@ -13,10 +13,16 @@ Example:
 
         $ python3 launch.py filename.csv -v
 
+    This example simulates the second quarter of rows 1-1000 (e.g. in the batch-scheduler job):
+
+        $ python3 launch.py filename.csv --rows 1-1000 --shard 1/4
+
     For more information about the format of the arguments, use the parameter "--help".
 
 Functions:
     launch: The entry point of the application.
+    parse_shard: Parse "--shard" parameter.
+    parse_rows: Parse "--rows" parameter.
 """
 
 ########################################################################################################################
@@ -28,6 +34,46 @@ import click
 from kmc_ising.supporting_tools import *
 
 
+########################################################################################################################
+# P A R A M E T E R   P A R S I N G :  #################################################################################
+########################################################################################################################
+
+
+def parse_shard(ctx, param, value):
+    """
+    Parse "--shard" parameter: "i/n" to (i, n).
+    """
+    if value is None:
+        return None
+    try:
+        i, n = (int(x) for x in value.split('/'))
+    except ValueError:
+        raise click.BadParameter('format is "i/n", e.g. "0/4"')
+    if not 0 <= i < n:
+        raise click.BadParameter('shard number "i" must be from 0 to n - 1')
+    return i, n
+
+
+def parse_rows(ctx, param, value):
+    """
+    Parse "--rows" parameter: "1-100,250,300-" to [(1, 100), (250, 250), (300, None)].
+    """
+    if value is None:
+        return None
+    rows = []
+    for part in value.split(','):
+        first, separator, last = part.partition('-')
+        try:
+            first = int(first)
+            last = int(last) if last else None if separator else first
+        except ValueError:
+            raise click.BadParameter('format is "first-last,...", e.g. "1-100,250,300-"')
+        if first < 1 or (last is not None and last < first):
+            raise click.BadParameter(f'wrong range "{part}"')
+        rows.append((first, last))
+    return rows
+
+
 ########################################################################################################################
 # E N T R Y   P O I N T :  #############################################################################################
 ########################################################################################################################
@@ -42,14 +88,25 @@ from kmc_ising.supporting_tools import *
 # Declaration of the parameters for terminal call: ---------------------------------------------------------------------
 @click.option('-v', is_flag=True,
               help=f'{UNDERLINE_ON}V{UNDERLINE_OFF}erbose mode.')
+@click.option('-p', is_flag=True,
+              help=f'{UNDERLINE_ON}P{UNDERLINE_OFF}acked spin state (one bit per spin, for very large chains).')
+@click.option('-c', type=click.IntRange(min=1), metavar='INTERVAL',
+              help=f'{UNDERLINE_ON}C{UNDERLINE_OFF}orrelation function C(r) and length, sampled every INTERVAL steps '
+                   '(needs about 20 bytes per spin on top of the state).')
+@click.option('-r', type=click.IntRange(min=1), default=1, metavar='REPLICAS',
+              help=f'{UNDERLINE_ON}R{UNDERLINE_OFF}eplicas of every row, reported as mean ± standard error.')
+@click.option('--shard', callback=parse_shard,
+              help='Simulate only the i-th (from 0) of n parts of the rows, format "i/n".')
+@click.option('--rows', callback=parse_rows,
+              help='Simulate only these rows (from 1), format "1-100,250,300-".')
 # ----------------------------------------------------------------------------------------------------------------------
-def launch(filename: str, v: bool):
+def launch(filename: str, v: bool, p: bool, c: int, r: int, shard: tuple, rows: list):
     # Output for "--help" option: --------------------------------------------------------------------------------------
     # TODO HELP OUTPUT
     # ------------------------------------------------------------------------------------------------------------------
 
     # Start the core module: -------------------------------------------------------------------------------------------
-    core = kmc_ising.core.Core(filename=filename, v=v)
+    core = kmc_ising.core.Core(filename=filename, v=v, p=p, c=c, r=r, shard=shard, rows=rows)
     core.start()
     # ------------------------------------------------------------------------------------------------------------------
 
@@ -0,0 +1,352 @@
+########################################################################################################################
+# M O D U L E   D O C U M E N T A T I O N : ############################################################################
+########################################################################################################################
+
+"""
+This module implements the compact spin state of a one-dimensional Ising chain.
+
+Spins are stored as packed bits in a NumPy uint64 array (bit "1" is spin +1, bit "0" is spin -1),
+ so one spin takes one bit instead of a pointer to a Python int. Instead of the sequence of the partial sums
+ every molecule is assigned to one of six rate classes (its own spin and the number of up neighbours),
+ and only the number of molecules of each class is kept: per block of spins in a Fenwick tree,
+ so a molecule with the given class can be found in O(log N).
+
+Classes:
+    PackedState: Bit-packed spin state with the class counts.
+"""
+
+########################################################################################################################
+# I M P O R T :  #######################################################################################################
+########################################################################################################################
+
+
+import random
+import numpy
+
+
+########################################################################################################################
+# S U P P O R T I N G   T O O L   F U N C T I O N :  ###################################################################
+########################################################################################################################
+
+
+_ZERO = numpy.uint64(0)
+_ONE = numpy.uint64(1)
+_FULL = numpy.uint64(0xFFFFFFFFFFFFFFFF)
+_BYTE_POPCOUNT = numpy.array([bin(x).count('1') for x in range(256)], dtype=numpy.uint8)
+
+
+def popcount(words):
+    """
+    Count set bits in every element of uint64 array.
+    """
+    if hasattr(numpy, 'bitwise_count'):
+        return numpy.bitwise_count(words)
+    # NumPy < 2.0 has no popcount - count bits of every byte: -----------------------------------------------------------
+    return _BYTE_POPCOUNT[words.view(numpy.uint8)].reshape(*words.shape, 8).sum(axis=-1, dtype=numpy.uint8)
+    # ------------------------------------------------------------------------------------------------------------------
+
+
+########################################################################################################################
+# M A I N   C L A S S :  ###############################################################################################
+########################################################################################################################
+
+
+class PackedState:
+    """
+    Bit-packed spin state with the class counts.
+
+    Class of the molecule is 3 * (its spin is up) + (number of up neighbours), so classes 0-2 are
+     down spins and classes 3-5 are up spins with 0, 1 and 2 up neighbours.
+
+    Attributes:
+        self._n: Number of molecules.
+        self._words: Packed spins.
+        self._tail_mask: Mask of the valid bits in the last word.
+        self._blocks: Number of blocks of BLOCK_WORDS words.
+        self._tree: Fenwick tree of the class counts per block.
+        self._class_counts: Number of molecules of each class in the chain.
+        self._up: Number of up spins.
+        self._walls: Number of neighbour pairs with different spins.
+    """
+
+    # ==================================================================================================================
+
+    BLOCK_WORDS = 64
+    CLASSES = 6
+
+    # ==================================================================================================================
+
+    def __init__(self, n, words):
+        self._n = n
+        self._words = words
+        tail = n % 64
+        self._tail_mask = numpy.uint64((1 << tail) - 1) if tail else _FULL
+        self._blocks = -(-len(words) // self.BLOCK_WORDS)
+        self._tree = None
+        self._class_counts = None
+        self._up = None
+        self._walls = None
+        self._recount()
+
+    # ==================================================================================================================
+
+    @classmethod
+    def from_random(cls, n, reuse=None):
+        """
+        Generate the random state (in the buffers of the reused state with the same N, if passed).
+        """
+        words = reuse._words if reuse is not None else numpy.empty(-(-n // 64), dtype=numpy.uint64)
+        generator = numpy.random.default_rng(random.getrandbits(64))
+        chunk = 1 << 17  # 1 MB of the random words
+        for start in range(0, len(words), chunk):
+            stop = min(start + chunk, len(words))
+            words[start:stop] = generator.integers(0, 2 ** 64, size=stop - start, dtype=numpy.uint64, endpoint=False)
+        return cls._build(n, words, reuse)
+
+    # ==================================================================================================================
+
+    @classmethod
+    def from_uniform(cls, n, up, reuse=None):
+        """
+        Generate the state with all spins up or down (in the buffers of the reused state with the same N, if passed).
+        """
+        words = reuse._words if reuse is not None else numpy.empty(-(-n // 64), dtype=numpy.uint64)
+        words.fill(_FULL if up else _ZERO)
+        return cls._build(n, words, reuse)
+
+    # ==================================================================================================================
+
+    @classmethod
+    def from_sequence(cls, sequence, reuse=None):
+        """
+        Generate the state from the sequence of spins -1 or 1 (in the buffers of the reused state
+         with the same N, if passed).
+        """
+        bits = numpy.packbits(numpy.asarray(sequence, dtype=numpy.int8) > 0, bitorder='little')
+        buffer = numpy.zeros(-(-len(bits) // 8) * 8, dtype=numpy.uint8)
+        buffer[:len(bits)] = bits
+        if reuse is None:
+            return cls._build(len(sequence), buffer.view('<u8').astype(numpy.uint64), reuse)
+        reuse._words[:] = buffer.view('<u8')
+        return cls._build(len(sequence), reuse._words, reuse)
+
+    # ==================================================================================================================
+
+    @classmethod
+    def _build(cls, n, words, reuse):
+        """
+        Create the state from the words, or recount the reused state which words were overwritten.
+        """
+        if reuse is None:
+            return cls(n, words)
+        reuse._recount()
+        return reuse
+
+    # ==================================================================================================================
+
+    def __len__(self):
+        return self._n
+
+    # ==================================================================================================================
+
+    def __getitem__(self, i):
+        """
+        Spin of the molecule (-1 or 1).
+        """
+        return 2 * self._bit(i % self._n) - 1
+
+    # ==================================================================================================================
+
+    @property
+    def magnetization(self):
+        """
+        Sum of the spins.
+        """
+        return 2 * self._up - self._n
+
+    # ==================================================================================================================
+
+    @property
+    def bond_sum(self):
+        """
+        Sum of the neighbour products s(i) * s(i + 1) over the ring.
+        """
+        return self._n - 2 * self._walls
+
+    # ==================================================================================================================
+
+    @property
+    def class_counts(self):
+        """
+        Number of molecules of each class in the chain.
+        """
+        return self._class_counts
+
+    # ==================================================================================================================
+
+    def fill_spins(self, out):
+        """
+        Unpack the spins (-1 or 1) to the given array of length N.
+        """
+        chunk = 1 << 14  # 1 MB of the unpacked bits
+        for start in range(0, len(self._words), chunk):
+            bits = numpy.unpackbits(self._words[start:start + chunk].view(numpy.uint8), bitorder='little')
+            stop = min(self._n, (start + chunk) * 64)
+            numpy.multiply(bits[:stop - start * 64], 2, out=out[start * 64:stop], casting='unsafe')
+            out[start * 64:stop] -= 1
+
+    # ==================================================================================================================
+
+    def set(self, i, spin):
+        """
+        Set the spin of the molecule and update the counts.
+        """
+        if self._bit(i) == (spin > 0):
+            return
+        # Remove old contributions of the molecule and its neighbours: -------------------------------------------------
+        sites = {(i - 1) % self._n, i, (i + 1) % self._n}
+        for j in sites:
+            self._add_site(j, -1)
+        self._walls -= self._bit(i) != self._bit((i - 1) % self._n)
+        self._walls -= self._bit(i) != self._bit((i + 1) % self._n)
+        # --------------------------------------------------------------------------------------------------------------
+
+        self._words[i >> 6] ^= _ONE << numpy.uint64(i & 63)
+        self._up += 1 if spin > 0 else -1
+
+        # Add new contributions: ---------------------------------------------------------------------------------------
+        for j in sites:
+            self._add_site(j, 1)
+        self._walls += self._bit(i) != self._bit((i - 1) % self._n)
+        self._walls += self._bit(i) != self._bit((i + 1) % self._n)
+        # --------------------------------------------------------------------------------------------------------------
+
+    # ==================================================================================================================
+
+    def find(self, class_index, k):
+        """
+        Find the k-th (from 0) molecule of the given class.
+        """
+        # Descend the Fenwick tree to the block: -----------------------------------------------------------------------
+        position = 0
+        step = 1 << (self._blocks.bit_length() - 1)
+        while step:
+            if position + step <= self._blocks and self._tree[position + step, class_index] <= k:
+                position += step
+                k -= int(self._tree[position, class_index])
+            step >>= 1
+        # --------------------------------------------------------------------------------------------------------------
+
+        # Find the word in the block and the bit in the word: ----------------------------------------------------------
+        start = position * self.BLOCK_WORDS
+        masks = self._class_masks(start, min(start + self.BLOCK_WORDS, len(self._words)))[class_index]
+        cumulative = numpy.cumsum(popcount(masks), dtype=numpy.int64)
+        word = int(numpy.searchsorted(cumulative, k, side='right'))
+        if word:
+            k -= int(cumulative[word - 1])
+        mask = int(masks[word])
+        for _ in range(k):
+            mask &= mask - 1
+        return (start + word) * 64 + (mask & -mask).bit_length() - 1
+        # --------------------------------------------------------------------------------------------------------------
+
+    # ==================================================================================================================
+
+    def _bit(self, i):
+        return (int(self._words[i >> 6]) >> (i & 63)) & 1
+
+    # ==================================================================================================================
+
+    def _site_class(self, i):
+        return 3 * self._bit(i) + self._bit((i - 1) % self._n) + self._bit((i + 1) % self._n)
+
+    # ==================================================================================================================
+
+    def _add_site(self, i, delta):
+        """
+        Add the molecule to (or remove from) the class counts.
+        """
+        class_index = self._site_class(i)
+        self._class_counts[class_index] += delta
+        position = i // (64 * self.BLOCK_WORDS) + 1
+        while position <= self._blocks:
+            self._tree[position, class_index] += delta
+            position += position & -position
+
+    # ==================================================================================================================
+
+    def _neighbours(self, start, stop):
+        """
+        Right (i + 1) and left (i - 1) neighbour of every bit for the words from start to stop.
+        """
+        words = self._words
+        total = len(words)
+        tail = self._n % 64
+        current = words[start:stop]
+        right = (current >> _ONE) | (words[numpy.arange(start + 1, stop + 1) % total] << numpy.uint64(63))
+        left = (current << _ONE) | (words[numpy.arange(start - 1, stop - 1) % total] >> numpy.uint64(63))
+        if stop == total and tail:  # The last molecule is followed by the first one
+            right[-1] |= (words[0] & _ONE) << numpy.uint64(tail - 1)
+        if start == 0 and tail:  # The first molecule is preceded by the last one
+            left[0] = (left[0] & ~_ONE) | ((words[-1] >> numpy.uint64(tail - 1)) & _ONE)
+        valid = numpy.full(len(current), _FULL, dtype=numpy.uint64)
+        if stop == total:
+            valid[-1] = self._tail_mask
+        return right & valid, left & valid, valid
+
+    # ==================================================================================================================
+
+    def _class_masks(self, start, stop):
+        """
+        Masks of the molecules of each class for the words from start to stop.
+        """
+        current = self._words[start:stop]
+        right, left, valid = self._neighbours(start, stop)
+        none = ~(right | left) & valid
+        one = right ^ left
+        both = right & left
+        down = ~current & valid
+        return numpy.stack([down & none, down & one, down & both, current & none, current & one, current & both])
+
+    # ==================================================================================================================
+
+    def _recount(self):
+        """
+        Clear the padding bits and count molecules of each class per block, building the Fenwick tree.
+        """
+        self._words[-1] &= self._tail_mask  # Padding bits are always zero
+        if self._tree is None:
+            self._tree = numpy.zeros((self._blocks + 1, self.CLASSES), dtype=numpy.int64)
+        else:
+            self._tree.fill(0)
+        self._up = 0
+        self._walls = 0
+
+        # Count the classes in chunks of blocks: -----------------------------------------------------------------------
+        chunk = 1024 * self.BLOCK_WORDS
+        for start in range(0, len(self._words), chunk):
+            stop = min(start + chunk, len(self._words))
+            counts = popcount(self._class_masks(start, stop)).astype(numpy.int64)
+            padding = -counts.shape[1] % self.BLOCK_WORDS
+            counts = numpy.pad(counts, ((0, 0), (0, padding))).reshape(self.CLASSES, -1, self.BLOCK_WORDS)
+            first = start // self.BLOCK_WORDS + 1
+            self._tree[first:first + counts.shape[1]] = counts.sum(axis=2).T
+            self._up += int(counts[3:].sum())
+            # Walls are the molecules with the different right neighbour: ----------------------------------------------
+            right, _, _ = self._neighbours(start, stop)
+            self._walls += int(popcount(self._words[start:stop] ^ right).sum(dtype=numpy.int64))
+            # ----------------------------------------------------------------------------------------------------------
+        # --------------------------------------------------------------------------------------------------------------
+        self._class_counts = [int(x) for x in self._tree[1:].sum(axis=0)]
+
+        # Build the Fenwick tree in place: -----------------------------------------------------------------------------
+        for position in range(1, self._blocks + 1):
+            parent = position + (position & -position)
+            if parent <= self._blocks:
+                self._tree[parent] += self._tree[position]
+        # --------------------------------------------------------------------------------------------------------------
+
+
+########################################################################################################################
+# E N D   O F   F I L E .  #############################################################################################
+########################################################################################################################
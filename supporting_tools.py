@@ -14,6 +14,7 @@ This module provides classes for convenient output of notifications,
 
 Functions:
     extract_parameter_sequence: Extract arguments from the row in .csv file.
+    row_index: Byte offsets of the rows in .csv file.
 
 Classes:
     Notification: For printing notifications.
@@ -28,6 +29,11 @@ Classes:
 import colorama
 import kmc_ising
 import datetime
+import itertools
+import mmap
+import numpy
+import os
+import tempfile
 
 
 ########################################################################################################################
@@ -48,32 +54,123 @@ YELLOW = colorama.Fore.LIGHTYELLOW_EX
 ########################################################################################################################
 
 
-def extract_parameter_sequence(filename):
+def extract_parameter_sequence(filename, rows=None, shard=None):
     """
     Extract arguments from the row in .csv file.
+
+    Without rows and shard the file is read from the top. Otherwise only the selected rows are read
+     through the row index: rows is a list of (first, last) ranges of the row numbers (from 1, inclusive,
+     last is None for the end of the file, rows beyond the end are skipped, overlapping ranges are merged,
+     so every row is read once and in order) and shard is (i, n) - the i-th (from 0) of n equal contiguous
+     parts of the selected rows.
     """
-    param_dict = {}
-    counter = 0
-    # Splitting .csv file: ---------------------------------------------------------------------------------------------
-    for row in open(filename, newline='\n'):
-        counter += 1
-        row = row[:-1].split(',')
+    # Read from the top: -----------------------------------------------------------------------------------------------
+    if rows is None and shard is None:
+        counter = 0
+        for row in open(filename, newline='\n'):
+            counter += 1
+            yield _parse_row(row, counter)
+        return
     # ------------------------------------------------------------------------------------------------------------------
-        try:
-            # The row number: ------------------------------------------------------------------------------------------
-            param_dict['#'] = counter
-            # ----------------------------------------------------------------------------------------------------------
-
-            # Model parameters: ----------------------------------------------------------------------------------------
-            param_dict['J'] = float(row[0])
-            param_dict['B'] = float(row[1])
-            param_dict['N'] = int(row[2])
-            param_dict['S'] = row[3:]
-            # ----------------------------------------------------------------------------------------------------------
-        except IndexError:  # If wrong format of the row
-            yield counter
+
+    # Select the row numbers: ------------------------------------------------------------------------------------------
+    offsets = row_index(filename)
+    total = len(offsets) - 1
+    if rows is None:
+        rows = [(1, None)]
+    merged = []
+    for first, last in sorted((first, min(total, last or total)) for first, last in rows):
+        if first > last:
+            continue
+        if merged and first <= merged[-1][1] + 1:  # Overlapping or adjacent ranges
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
         else:
-            yield param_dict
+            merged.append((first, last))
+    rows = merged
+    numbers = itertools.chain.from_iterable(range(first, last + 1) for first, last in rows)
+    if shard is not None:
+        selected = sum(last - first + 1 for first, last in rows)
+        numbers = itertools.islice(numbers, shard[0] * selected // shard[1], (shard[0] + 1) * selected // shard[1])
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # Read the selected rows: ------------------------------------------------------------------------------------------
+    if not total:
+        return
+    with open(filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as memory:
+        for counter in numbers:
+            row = memory[int(offsets[counter - 1]):int(offsets[counter])].decode()
+            yield _parse_row(row, counter)
+    # ------------------------------------------------------------------------------------------------------------------
+
+
+def _parse_row(row, counter):
+    """
+    Extract arguments from one row, return the row number if the row has wrong format.
+    """
+    param_dict = {}
+    row = row[:-1].split(',')
+    try:
+        # The row number: ----------------------------------------------------------------------------------------------
+        param_dict['#'] = counter
+        # --------------------------------------------------------------------------------------------------------------
+
+        # Model parameters: --------------------------------------------------------------------------------------------
+        param_dict['J'] = float(row[0])
+        param_dict['B'] = float(row[1])
+        param_dict['N'] = int(row[2])
+        param_dict['S'] = row[3:]
+        # --------------------------------------------------------------------------------------------------------------
+    except IndexError:  # If wrong format of the row
+        return counter
+    else:
+        return param_dict
+
+
+def row_index(filename):
+    """
+    Byte offsets of the rows in .csv file.
+
+    Offset of the row k (from 1) is index[k - 1], index[-1] is the file size. The index is built once
+     and cached next to the file as "<filename>.index.npy", it is rebuilt if the file was changed.
+    """
+    index_filename = f'{filename}.index.npy'
+    stat = os.stat(filename)
+    if stat.st_size == 0:  # Empty file has no rows and can't be memory-mapped
+        return numpy.zeros(1, dtype=numpy.uint64)
+
+    # Try the cached index (its first two elements are the file size and the modification time): ---------------------
+    try:
+        cached = numpy.load(index_filename, mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+    else:
+        if len(cached) > 2 and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2:]
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # Find the newlines chunk by chunk: --------------------------------------------------------------------------------
+    chunk = 1 << 26
+    offsets = [numpy.array([stat.st_size, stat.st_mtime_ns, 0], dtype=numpy.uint64)]
+    with open(filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as memory:
+        for start in range(0, stat.st_size, chunk):
+            data = numpy.frombuffer(memory[start:start + chunk], dtype=numpy.uint8)
+            offsets.append(numpy.flatnonzero(data == ord('\n')).astype(numpy.uint64) + numpy.uint64(start + 1))
+    index = numpy.concatenate(offsets)
+    if index[-1] != stat.st_size:  # The last row without newline
+        index = numpy.append(index, numpy.uint64(stat.st_size))
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # Save the index through the unique temporary file (jobs on different nodes may have the same PID): ---------------
+    try:
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(index_filename) or '.', delete=False,
+                                         suffix='.npy') as temporary:
+            numpy.save(temporary, index)
+        os.replace(temporary.name, index_filename)
+    except OSError:  # The index is not cached if the directory is read-only
+        if 'temporary' in locals() and os.path.exists(temporary.name):
+            os.remove(temporary.name)
+    # ------------------------------------------------------------------------------------------------------------------
+    return index[2:]
 
 
 ########################################################################################################################
@@ -0,0 +1,39 @@
+########################################################################################################################
+# M O D U L E   D O C U M E N T A T I O N : ############################################################################
+########################################################################################################################
+
+"""
+Test configuration of "kmc_ising".
+
+The repository root is the package itself, so it is registered as "kmc_ising"
+ whatever the name of the checkout directory is.
+"""
+
+########################################################################################################################
+# I M P O R T :  #######################################################################################################
+########################################################################################################################
+
+
+import importlib.util
+import os
+import sys
+
+
+########################################################################################################################
+# P A C K A G E   R E G I S T R A T I O N :  ###########################################################################
+########################################################################################################################
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if 'kmc_ising' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('kmc_ising', os.path.join(ROOT, '__init__.py'),
+                                                  submodule_search_locations=[ROOT])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['kmc_ising'] = module
+    spec.loader.exec_module(module)
+
+
+########################################################################################################################
+# E N D   O F   F I L E .  #############################################################################################
+########################################################################################################################
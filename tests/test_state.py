@@ -0,0 +1,129 @@
+########################################################################################################################
+# M O D U L E   D O C U M E N T A T I O N : ############################################################################
+########################################################################################################################
+
+"""
+Tests of the bit-packed spin state and its agreement with the list state.
+
+PackedState is checked against the brute-force counts over a list of spins,
+ PackedKmcIsing - against KmcIsing step by step on the same state.
+"""
+
+########################################################################################################################
+# I M P O R T :  #######################################################################################################
+########################################################################################################################
+
+
+import random
+import numpy
+import pytest
+from kmc_ising.algorithm import KmcIsing
+from kmc_ising.algorithm import PackedKmcIsing
+from kmc_ising.state import PackedState
+
+
+########################################################################################################################
+# S U P P O R T I N G   T O O L   F U N C T I O N :  ###################################################################
+########################################################################################################################
+
+
+SIZES = [1, 2, 3, 63, 64, 65, 129, 4097, 64 * 4096 + 5]
+
+
+def brute_force_classes(spins):
+    """
+    Class of every molecule: 3 * (its spin is up) + (number of up neighbours).
+    """
+    n = len(spins)
+    return [3 * (spins[i] > 0) + (spins[i - 1] > 0) + (spins[(i + 1) % n] > 0) for i in range(n)]
+
+
+def random_chain(n, seed):
+    """
+    Random spins and the packed state after random changes of the spins.
+    """
+    generator = random.Random(seed)
+    spins = [generator.choice([-1, 1]) for _ in range(n)]
+    state = PackedState.from_sequence(spins)
+    for _ in range(300):
+        i = generator.randrange(n)
+        spins[i] = generator.choice([-1, 1])
+        state.set(i, spins[i])
+    return spins, state
+
+
+########################################################################################################################
+# T E S T S :  #########################################################################################################
+########################################################################################################################
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_counts_match_brute_force(n):
+    spins, state = random_chain(n, n)
+    classes = brute_force_classes(spins)
+    assert state.class_counts == [classes.count(c) for c in range(PackedState.CLASSES)]
+    assert state.magnetization == sum(spins)
+    assert state.bond_sum == sum(spins[i] * spins[(i + 1) % n] for i in range(n))
+    assert [state[i] for i in range(n)] == spins
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_find_matches_brute_force(n):
+    spins, state = random_chain(n, n + 1)
+    classes = brute_force_classes(spins)
+    for class_index in range(PackedState.CLASSES):
+        molecules = [i for i in range(n) if classes[i] == class_index]
+        for k in range(0, len(molecules), max(1, len(molecules) // 7)):
+            assert state.find(class_index, k) == molecules[k]
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_fill_spins(n):
+    spins, state = random_chain(n, n + 2)
+    out = numpy.empty(n)
+    state.fill_spins(out)
+    assert out.tolist() == spins
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_reused_state_is_recounted(n):
+    spins, _ = random_chain(n, n + 3)
+    reused = PackedState.from_random(n)
+    assert PackedState.from_sequence(spins, reused) is reused
+    fresh = PackedState.from_sequence(spins)
+    assert reused.class_counts == fresh.class_counts
+    assert reused.bond_sum == fresh.bond_sum
+    assert (reused._tree == fresh._tree).all()
+
+
+@pytest.mark.parametrize('n', [2, 3, 4, 12, 65])
+def test_backends_agree_step_by_step(n):
+    generator = random.Random(n)
+    kwargs = dict(J=0.7, B=0.2, N=n, S=[str(generator.choice([-1, 1])) for _ in range(n)])
+    packed = PackedKmcIsing('test.csv', **kwargs)
+    plain = KmcIsing('test.csv', **kwargs)
+    packed._generate_state()
+    plain._generate_state()
+    for _ in range(10 * n):
+        plain._count_partial_sums()
+        plain._count_r()
+        packed._count_r()
+        assert packed._r == pytest.approx(plain._r)
+        packed._generate_p()
+        packed._count_delta_t()
+        packed._choose_molecule()
+        spin = generator.choice([-1, 1])
+        plain._chosen_molecule = packed._chosen_molecule
+        packed._state.set(packed._chosen_molecule, spin)
+        plain._state[plain._chosen_molecule] = spin
+        packed._delta_t = plain._delta_t = 1.0
+        for model in (packed, plain):
+            model._add_to_mt()
+            model._add_to_jt()
+        assert packed._mt == plain._mt
+        assert packed._jt == pytest.approx(plain._jt)
+
+
+########################################################################################################################
+# E N D   O F   F I L E .  #############################################################################################
+########################################################################################################################